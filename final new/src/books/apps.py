@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class BooksConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'books'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedBookRequest, BookRequest
+
+SETTLED_STATUSES = ('accepted', 'rejected')
+DEFAULT_BATCH_SIZE = 500
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.BOOK_REQUEST_ARCHIVE_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_settled_requests(cutoff, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Move settled requests last updated before ``cutoff`` into the archive table,
+    one batch per transaction. Returns the number of archived requests.
+    """
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                BookRequest.objects.select_for_update().filter(
+                    status__in=SETTLED_STATUSES,
+                    updated_at__lt=cutoff
+                ).order_by('id').values(
+                    'id', 'book_id', 'requester_id', 'message', 'status', 'created_at', 'updated_at'
+                )[:batch_size]
+            )
+            if not rows:
+                return archived
+
+            ArchivedBookRequest.objects.bulk_create([ArchivedBookRequest(**row) for row in rows])
+            # Archiving is not a deletion for sync clients, so delete the moved
+            # rows with plain SQL that skips the pre_delete tombstones
+            ids = [row['id'] for row in rows]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'DELETE FROM {connection.ops.quote_name(BookRequest._meta.db_table)} '
+                    f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                    ids
+                )
+            archived += len(rows)
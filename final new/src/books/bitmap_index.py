@@ -0,0 +1,195 @@
+"""
+Per-worker bitmap index of books by genre, author and status.
+
+Each bitmap is a Python int with bit ``n`` set when book ``n`` matches, so
+multi-value filters resolve with ``&``/``|`` instead of SQL joins. Signals
+keep the index current for changes made by this worker and bump a version in
+the 'shared' cache, so every worker rebuilds from the primary on its next read
+after a change made elsewhere. The index is also rebuilt every BOOK_INDEX_TTL
+seconds to pick up changes made without signals, such as queryset updates.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Book
+
+VERSION_KEY = 'book-index-version'
+
+
+class BitmapIds:
+    """
+    Book ids of a bitmap, newest first, sliced lazily for pagination.
+    """
+
+    def __init__(self, bitmap):
+        self.bitmap = bitmap
+        self._bits = None
+
+    def __len__(self):
+        return self.bitmap.bit_count()
+
+    def __iter__(self):
+        return iter(self[0:len(self)])
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('BitmapIds only supports slicing')
+        start, stop, _ = index.indices(len(self))
+        if self._bits is None:
+            self._bits = bin(self.bitmap)[2:]
+        bits = self._bits
+        ids = []
+        position = -1
+        for _ in range(stop):
+            position = bits.find('1', position + 1)
+            ids.append(len(bits) - 1 - position)
+        return ids[start:]
+
+
+class BookBitmapIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built_at = None
+        self._version = None
+        self.all = 0
+        self.genres = {}
+        self.authors = {}
+        self.statuses = {}
+
+    def _ensure_built(self):
+        if (
+            self._built_at is None
+            or time.monotonic() - self._built_at > settings.BOOK_INDEX_TTL
+            or caches['shared'].get(VERSION_KEY, 0) != self._version
+        ):
+            self.rebuild()
+
+    def rebuild(self):
+        with self._lock:
+            # Read before loading, so changes committed meanwhile rebuild again
+            version = caches['shared'].get(VERSION_KEY, 0)
+            everything = 0
+            statuses = {}
+            for book_id, status in Book.objects.using(DEFAULT_DB_ALIAS).values_list('id', 'status'):
+                everything |= 1 << book_id
+                statuses[status] = statuses.get(status, 0) | 1 << book_id
+            self.all = everything
+            self.statuses = statuses
+            self.genres = self._load(Book.genres.through, 'genre_id')
+            self.authors = self._load(Book.authors.through, 'author_id')
+            self._built_at = time.monotonic()
+            self._version = version
+
+    @staticmethod
+    def _load(through, field):
+        bitmaps = {}
+        for book_id, key in through.objects.using(DEFAULT_DB_ALIAS).values_list('book_id', field):
+            bitmaps[key] = bitmaps.get(key, 0) | 1 << book_id
+        return bitmaps
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+
+    def resolve(self, genres_all=(), genres_any=(), authors_all=(), authors_any=(), statuses=()):
+        """
+        Return the bitmap of books matching every given condition.
+        """
+        with self._lock:
+            self._ensure_built()
+            result = self.all
+            for genre_id in genres_all:
+                result &= self.genres.get(genre_id, 0)
+            for author_id in authors_all:
+                result &= self.authors.get(author_id, 0)
+            if genres_any:
+                result &= self._union(self.genres, genres_any)
+            if authors_any:
+                result &= self._union(self.authors, authors_any)
+            if statuses:
+                result &= self._union(self.statuses, statuses)
+            return result
+
+    @staticmethod
+    def _union(bitmaps, keys):
+        result = 0
+        for key in keys:
+            result |= bitmaps.get(key, 0)
+        return result
+
+    # Incremental updates, applied in place only while no other worker has
+    # changed the books since the last one
+
+    def _bump(self):
+        """
+        Bump the shared version and return whether this change can be applied
+        to the index in place; otherwise the next read rebuilds it.
+        """
+        cache = caches['shared']
+        cache.add(VERSION_KEY, 0, None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = None
+        if self._built_at is not None and self._version is not None and version == self._version + 1:
+            self._version = version
+            return True
+        self._built_at = None
+        return False
+
+    def set_status(self, book_ids, status):
+        with self._lock:
+            if not self._bump():
+                return
+            for book_id in book_ids:
+                bit = 1 << book_id
+                self.all |= bit
+                for key in self.statuses:
+                    self.statuses[key] &= ~bit
+                self.statuses[status] = self.statuses.get(status, 0) | bit
+
+    def remove_book(self, book_id):
+        with self._lock:
+            if not self._bump():
+                return
+            mask = ~(1 << book_id)
+            self.all &= mask
+            for bitmaps in (self.statuses, self.genres, self.authors):
+                for key in bitmaps:
+                    bitmaps[key] &= mask
+
+    def add_relations(self, field, book_ids, keys):
+        with self._lock:
+            if not self._bump():
+                return
+            bitmaps = getattr(self, field)
+            for key in keys:
+                for book_id in book_ids:
+                    bitmaps[key] = bitmaps.get(key, 0) | 1 << book_id
+
+    def remove_relations(self, field, book_ids, keys=None):
+        """
+        Unlink books from ``keys``, or from every key when ``keys`` is None.
+        """
+        with self._lock:
+            if not self._bump():
+                return
+            bitmaps = getattr(self, field)
+            mask = 0
+            for book_id in book_ids:
+                mask |= 1 << book_id
+            for key in (bitmaps if keys is None else keys):
+                if key in bitmaps:
+                    bitmaps[key] &= ~mask
+
+    def remove_key(self, field, key):
+        with self._lock:
+            if self._bump():
+                getattr(self, field).pop(key, None)
+
+
+book_index = BookBitmapIndex()
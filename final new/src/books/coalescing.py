@@ -0,0 +1,61 @@
+import threading
+
+from django.core.cache import caches
+
+import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time in this worker. Callers
+    arriving while it runs wait for it and share its result or exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.incr(f'{self.name}.coalesced')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+book_detail_flight = SingleFlight('book_detail')
+
+
+def book_detail_cache_key(book_id):
+    return f'book-detail:{book_id}'
+
+
+def invalidate_book_details(book_ids):
+    # Details are cached in the cache shared by all workers, so this reaches every one of them
+    caches['shared'].delete_many([book_detail_cache_key(book_id) for book_id in book_ids])
@@ -0,0 +1,276 @@
+"""
+Pub/sub for book request notifications across worker processes.
+
+Events are appended to a SQLite log in CACHE_DIR that every worker on the host
+shares, so a client receives an event whichever worker published it and can
+resume from its last event on any worker. Publishing wakes the waiting clients
+of the same worker at once; other workers notice new events within
+POLL_INTERVAL seconds. Event ids are "<log>-<sequence>". A client whose id did
+not come from this log, or whose unseen events were already pruned, receives a
+``reset`` event and should catch up through the changes feed.
+"""
+import asyncio
+import json
+import threading
+import time
+
+from django.db import transaction
+
+from shared_store import SQLiteFile
+
+from .models import BookRequest
+
+EVENT_LOG = 'events.sqlite3'
+BATCH_SIZE = 100
+RETENTION_SECONDS = 600
+POLL_INTERVAL = 1
+PRUNE_INTERVAL = 60
+HEARTBEAT_INTERVAL = 15
+STREAM_DURATION = 300
+LONG_POLL_TIMEOUT = 25
+RETRY_MILLISECONDS = 3000
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS event (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        data TEXT NOT NULL,
+        created REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS event_user_idx ON event (user_id, seq);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value NOT NULL);
+    INSERT OR IGNORE INTO meta (key, value) VALUES
+        ('log_id', lower(hex(randomblob(4)))), ('pruned_through', 0);
+"""
+
+
+class EventBroker:
+    def __init__(self, name=EVENT_LOG, batch_size=BATCH_SIZE, retention_seconds=RETENTION_SECONDS,
+                 poll_interval=POLL_INTERVAL):
+        self.batch_size = batch_size
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+        self._log = SQLiteFile(name, SCHEMA)
+        self._log_id = None
+        self._condition = threading.Condition()
+        # Highest sequence this worker knows has been published
+        self._last_seq = 0
+        self._polled_at = 0
+        self._pruned_at = 0
+        # Event loop -> asyncio.Event set once new events are known
+        self._wakeups = {}
+
+    @property
+    def log_id(self):
+        if self._log_id is None:
+            self._log_id = self._log.execute("SELECT value FROM meta WHERE key = 'log_id'").fetchone()[0]
+        return self._log_id
+
+    def event_id(self, seq):
+        return f'{self.log_id}-{seq}'
+
+    def position(self, last_event_id):
+        """
+        Return the sequence number to resume after. A client without an id
+        starts at the live edge; an id this log did not issue gets -1, so the
+        client is sent a ``reset`` first.
+        """
+        self._poll(force=True)
+        if last_event_id is None:
+            return self._last_seq
+        log_id, _, seq = last_event_id.partition('-')
+        try:
+            seq = int(seq)
+        except ValueError:
+            return -1
+        if log_id != self.log_id or not 0 <= seq <= self._last_seq:
+            return -1
+        return seq
+
+    def publish(self, user_ids, event_type, data):
+        """
+        Append an event for each user. Returns the events by user id.
+        """
+        now = time.time()
+        payload = json.dumps(data)
+        seqs = {}
+        with self._log.transaction() as connection:
+            for user_id in set(user_ids):
+                seqs[user_id] = connection.execute(
+                    'INSERT INTO event (user_id, event, data, created) VALUES (?, ?, ?, ?)',
+                    (user_id, event_type, payload, now)
+                ).lastrowid
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._prune(now)
+        if seqs:
+            self._advance(max(seqs.values()))
+        return {
+            user_id: {'id': self.event_id(seq), 'event': event_type, 'data': data}
+            for user_id, seq in seqs.items()
+        }
+
+    def _prune(self, now):
+        self._pruned_at = now
+        with self._log.transaction() as connection:
+            pruned_through = connection.execute(
+                'SELECT MAX(seq) FROM event WHERE created < ?', (now - self.retention_seconds,)
+            ).fetchone()[0]
+            if pruned_through is not None:
+                connection.execute('DELETE FROM event WHERE seq <= ?', (pruned_through,))
+                connection.execute(
+                    "UPDATE meta SET value = MAX(value, ?) WHERE key = 'pruned_through'", (pruned_through,)
+                )
+
+    def _poll(self, force=False):
+        # Pick up events published by other workers, at most once per interval
+        now = time.monotonic()
+        with self._condition:
+            if not force and now - self._polled_at < self.poll_interval:
+                return
+            self._polled_at = now
+        row = self._log.execute("SELECT seq FROM sqlite_sequence WHERE name = 'event'").fetchone()
+        if row is not None:
+            self._advance(row[0])
+
+    def _advance(self, seq):
+        with self._condition:
+            if seq <= self._last_seq:
+                return
+            self._last_seq = seq
+            self._condition.notify_all()
+            wakeups, self._wakeups = self._wakeups, {}
+        for loop, wakeup in wakeups.items():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # The loop was closed
+                pass
+
+    def wait(self, user_id, position, timeout):
+        """
+        Return ``(events, position)`` with the events after ``position``,
+        blocking up to ``timeout`` seconds until one is published.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            seen = self._last_seq
+            events, new_position = self._events_after(user_id, position)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                return events, new_position
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._last_seq > seen, timeout=min(remaining, self.poll_interval)
+                )
+            self._poll()
+
+    async def await_events(self, user_id, position, timeout):
+        """
+        Like wait(), but suspends the coroutine instead of blocking a thread.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            with self._condition:
+                wakeup = self._wakeups.get(loop)
+                if wakeup is None:
+                    wakeup = self._wakeups[loop] = asyncio.Event()
+            events, new_position = self._events_after(user_id, position)
+            remaining = deadline - loop.time()
+            if events or remaining <= 0:
+                return events, new_position
+            try:
+                await asyncio.wait_for(wakeup.wait(), min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            self._poll()
+
+    def _events_after(self, user_id, position):
+        rows = self._log.execute(
+            'SELECT seq, event, data FROM event WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?',
+            (user_id, position, self.batch_size)
+        ).fetchall()
+        events = [
+            {'id': self.event_id(seq), 'event': event_type, 'data': json.loads(data)}
+            for seq, event_type, data in rows
+        ]
+        pruned_through = self._log.execute("SELECT value FROM meta WHERE key = 'pruned_through'").fetchone()[0]
+        if position < pruned_through:
+            # Some events the client has not seen are gone
+            events.insert(0, {'id': self.event_id(pruned_through), 'event': 'reset', 'data': {}})
+            position = pruned_through
+        if rows:
+            position = rows[-1][0]
+        return events, position
+
+    @property
+    def last_seq(self):
+        self._poll(force=True)
+        return self._last_seq
+
+
+broker = EventBroker()
+
+
+def parse_last_event_id(request):
+    return request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id') or None
+
+
+def format_event(event):
+    return (
+        f"id: {event['id']}\n"
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event['data'])}\n\n"
+    )
+
+
+def stream_position(last_event_id):
+    return broker.position(last_event_id)
+
+
+def stream(user_id, last_event_id, duration=STREAM_DURATION, heartbeat=HEARTBEAT_INTERVAL):
+    position = stream_position(last_event_id)
+    deadline = time.monotonic() + duration
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    while time.monotonic() < deadline:
+        events, position = broker.wait(user_id, position, timeout=heartbeat)
+        if not events:
+            yield ": heartbeat\n\n"
+        for event in events:
+            yield format_event(event)
+
+
+async def astream(user_id, last_event_id, duration=STREAM_DURATION, heartbeat=HEARTBEAT_INTERVAL):
+    position = stream_position(last_event_id)
+    deadline = time.monotonic() + duration
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    while time.monotonic() < deadline:
+        events, position = await broker.await_events(user_id, position, heartbeat)
+        if not events:
+            yield ": heartbeat\n\n"
+        for event in events:
+            yield format_event(event)
+
+
+def publish_request_events(event_type, request_ids):
+    """
+    Notify the requester and the book owner of each request once the current
+    transaction commits.
+    """
+    request_ids = list(request_ids)
+    if not request_ids:
+        return
+
+    def publish():
+        rows = BookRequest.objects.filter(id__in=request_ids).values(
+            'id', 'book_id', 'status', 'requester_id', 'book__owner_id'
+        )
+        for row in rows:
+            broker.publish(
+                [row['requester_id'], row['book__owner_id']],
+                event_type,
+                {'id': row['id'], 'book': row['book_id'], 'status': row['status']}
+            )
+
+    transaction.on_commit(publish)
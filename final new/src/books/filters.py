@@ -0,0 +1,39 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .bitmap_index import BitmapIds, book_index
+
+BITMAP_PARAMS = ('genres_all', 'genres_any', 'authors_all', 'authors_any', 'status_any')
+
+
+def _parse_ids(name, value):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
+        raise ValidationError({name: "Expected comma-separated IDs"})
+
+
+class BitmapIndexFilter(BaseFilterBackend):
+    """
+    Multi-value filters resolved from the bitmap index:
+    genres_all/authors_all match every ID, genres_any/authors_any/status_any
+    match at least one value.
+    """
+
+    def get_bitmap(self, request):
+        params = request.query_params
+        if not any(params.get(name) for name in BITMAP_PARAMS):
+            return None
+        return book_index.resolve(
+            genres_all=_parse_ids('genres_all', params.get('genres_all', '')),
+            genres_any=_parse_ids('genres_any', params.get('genres_any', '')),
+            authors_all=_parse_ids('authors_all', params.get('authors_all', '')),
+            authors_any=_parse_ids('authors_any', params.get('authors_any', '')),
+            statuses=[status for status in params.get('status_any', '').split(',') if status]
+        )
+
+    def filter_queryset(self, request, queryset, view):
+        bitmap = self.get_bitmap(request)
+        if bitmap is None:
+            return queryset
+        return queryset.filter(id__in=list(BitmapIds(bitmap)))
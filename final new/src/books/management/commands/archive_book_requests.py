@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.archive import DEFAULT_BATCH_SIZE, archive_cutoff, archive_settled_requests
+
+
+class Command(BaseCommand):
+    help = "Move settled book requests older than the given age into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Archive requests settled more than this many days ago "
+                 "(default: BOOK_REQUEST_ARCHIVE_DAYS setting)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help="Number of requests moved per transaction"
+        )
+        parser.add_argument(
+            '--every', type=int, default=None, metavar='SECONDS',
+            help="Keep running and archive every SECONDS seconds"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            archived = archive_settled_requests(archive_cutoff(options['days']), options['batch_size'])
+            self.stdout.write(f"Archived {archived} book requests.")
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,60 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from books.renderers import FastJSONRenderer, MessagePackRenderer, orjson, msgpack
+
+
+def sample_page(books):
+    """
+    Paginated payload shaped like BookSerializer output.
+    """
+    now = timezone.now().isoformat()
+    return {
+        'count': books,
+        'next': None,
+        'previous': None,
+        'results': [
+            {
+                'id': i,
+                'authors': [
+                    {'id': 1, 'name': 'Konstantine Gamsakhurdia', 'biography': 'Georgian author'},
+                    {'id': 2, 'name': 'Shota Rustaveli', 'biography': 'Georgian author'},
+                ],
+                'genres': [{'id': 1, 'name': 'Fantasy', 'description': 'Fantasy books'}],
+                'title': f'Book {i}',
+                'description': 'A long description of the book. ' * 10,
+                'status': 'available',
+                'cover_image': None,
+                'pickup_location': 'Tbilisi, Rustaveli Avenue',
+                'created_at': now,
+                'updated_at': now,
+                'owner': 1,
+            }
+            for i in range(books)
+        ],
+    }
+
+
+class Command(BaseCommand):
+    help = "Compare encode time and payload size of the available renderers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--books', type=int, default=100, help="Books per page")
+        parser.add_argument('--repeat', type=int, default=200, help="Renders per renderer")
+
+    def handle(self, *args, **options):
+        data = sample_page(options['books'])
+        candidates = [('json (stdlib)', JSONRenderer())]
+        if orjson is not None:
+            candidates.append(('json (orjson)', FastJSONRenderer()))
+        if msgpack is not None:
+            candidates.append(('msgpack', MessagePackRenderer()))
+
+        self.stdout.write(f"{'renderer':<16}{'ms/render':>12}{'bytes':>12}")
+        for name, renderer in candidates:
+            payload = renderer.render(data)
+            seconds = timeit.timeit(lambda: renderer.render(data), number=options['repeat'])
+            self.stdout.write(f"{name:<16}{seconds / options['repeat'] * 1000:>12.3f}{len(payload):>12}")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.sync import purge_tombstones, tombstone_cutoff
+
+
+class Command(BaseCommand):
+    help = "Delete tombstones of deleted books and requests older than the given age."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help="Delete tombstones recorded more than this many days ago "
+                 "(default: TOMBSTONE_RETENTION_DAYS setting)"
+        )
+        parser.add_argument(
+            '--every', type=int, default=None, metavar='SECONDS',
+            help="Keep running and purge every SECONDS seconds"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_tombstones(tombstone_cutoff(options['days']))
+            self.stdout.write(f"Purged {purged} tombstones.")
+            if options['every'] is None:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class ArchivedBookRequest(models.Model):
+    """
+    Settled book request moved out of ``book_request`` by the archival job.
+    Keeps the original request id.
+    """
+    class Meta:
+        db_table = 'book_request_archive'
+
+    id = models.BigIntegerField(primary_key=True)
+    book = models.ForeignKey('Book', on_delete=models.CASCADE, related_name='archived_requests')
+    requester = models.ForeignKey('users.User', on_delete=models.CASCADE, related_name='archived_book_requests')
+    message = models.TextField(null=True)
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
@@ -8,6 +8,9 @@ from users.models import User
 class Book(models.Model):
     class Meta:
         db_table = 'book'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='book_updated_at_idx'),
+        ]
 
     STATUS_CHOICES = [
         ('available', 'Available'),
@@ -5,6 +5,10 @@ from rest_framework.exceptions import ValidationError
 class BookRequest(models.Model):
     class Meta:
         db_table = 'book_request'
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='book_request_updated_at_idx'),
+            models.Index(fields=['status', 'updated_at'], name='book_request_settled_idx'),
+        ]
 
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class Tombstone(models.Model):
+    """
+    Record of a deleted book or book request, kept so that clients syncing
+    through the changes feed can drop the object locally.
+    """
+    class Meta:
+        db_table = 'tombstone'
+        indexes = [
+            models.Index(fields=['model', 'deleted_at', 'object_id'], name='tombstone_sync_idx'),
+        ]
+
+    MODEL_CHOICES = [
+        ('book', 'Book'),
+        ('bookrequest', 'Book request'),
+    ]
+
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    owner_id = models.BigIntegerField(null=True)
+    requester_id = models.BigIntegerField(null=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.model} {self.object_id}'
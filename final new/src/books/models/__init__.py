@@ -3,5 +3,7 @@ from .Author import Author
 from .Genre import Genre
 from .Book import Book
 from .BookRequest import BookRequest
+from .Tombstone import Tombstone
+from .ArchivedBookRequest import ArchivedBookRequest
 
-__all__ = ['Author', 'Genre', 'Book', 'BookRequest']
\ No newline at end of file
+__all__ = ['Author', 'Genre', 'Book', 'BookRequest', 'Tombstone', 'ArchivedBookRequest']
\ No newline at end of file
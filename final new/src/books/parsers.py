@@ -0,0 +1,31 @@
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from .renderers import orjson, msgpack
+
+
+class FastJSONParser(parsers.JSONParser):
+    """
+    JSON parser backed by orjson when it is installed.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(parsers.BaseParser):
+    """
+    MessagePack parser for internal service clients. Requires msgpack.
+    """
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
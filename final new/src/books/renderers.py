@@ -0,0 +1,63 @@
+import json
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _default(obj):
+    # Same conversions as DRF's JSON encoder (dates, decimals, lazy strings, ...)
+    return encoders.JSONEncoder().default(obj)
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    """
+    JSON renderer backed by orjson when it is installed. Falls back to DRF's
+    stdlib encoder without orjson and for indented output.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    MessagePack renderer for internal service clients. Requires msgpack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """
+    Lets views negotiate ``text/event-stream``. Views stream their own
+    events; this only renders error responses as a single ``error`` event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode(self.charset)
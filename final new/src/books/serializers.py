@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Author, Genre, Book, BookRequest
+from .models import Author, Genre, Book, BookRequest, ArchivedBookRequest
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -53,3 +53,38 @@ class BookRequestSerializer(serializers.ModelSerializer):
         representation['book_title'] = instance.book.title
         representation['requester_email'] = instance.requester.email
         return representation
+
+
+class ArchivedBookRequestSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedBookRequest
+        fields = ['id', 'book', 'requester', 'status', 'message', 'created_at', 'updated_at', 'archived_at']
+        read_only_fields = fields
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation['book_title'] = instance.book.title
+        representation['requester_email'] = instance.requester.email
+        return representation
+
+
+class BookRequestBulkModerateSerializer(serializers.Serializer):
+    MAX_IDS = 200
+
+    accept = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list,
+        max_length=MAX_IDS
+    )
+    reject = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        default=list,
+        max_length=MAX_IDS
+    )
+
+    def validate(self, attrs):
+        if not attrs['accept'] and not attrs['reject']:
+            raise serializers.ValidationError("Provide at least one request ID to accept or reject")
+        return attrs
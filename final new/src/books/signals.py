@@ -0,0 +1,120 @@
+import weakref
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .bitmap_index import book_index
+from .coalescing import invalidate_book_details
+from .models import Author, Book, BookRequest, Genre, Tombstone
+
+
+@receiver(pre_delete, sender=Book)
+def record_book_deletion(sender, instance, using, **kwargs):
+    Tombstone.objects.using(using).create(
+        model='book',
+        object_id=instance.pk,
+        owner_id=instance.owner_id
+    )
+
+
+# Book owners looked up by the delete operations in progress, keyed by their origin
+_book_owners = weakref.WeakKeyDictionary()
+
+
+def _book_owner_id(book_id, origin, using):
+    """
+    Return the owner of ``book_id``, querying each book at most once per delete
+    so cascades over many requests of the same book stay cheap.
+    """
+    if isinstance(origin, Book) and origin.pk == book_id:
+        return origin.owner_id
+    owners = _book_owners.setdefault(origin, {}) if origin is not None else {}
+    if book_id not in owners:
+        owners[book_id] = Book.objects.using(using).values_list('owner_id', flat=True).get(pk=book_id)
+    return owners[book_id]
+
+
+@receiver(pre_delete, sender=BookRequest)
+def record_book_request_deletion(sender, instance, using, origin=None, **kwargs):
+    Tombstone.objects.using(using).create(
+        model='bookrequest',
+        object_id=instance.pk,
+        owner_id=_book_owner_id(instance.book_id, origin, using),
+        requester_id=instance.requester_id
+    )
+
+
+@receiver(post_save, sender=Book)
+def index_book_status(sender, instance, **kwargs):
+    book_id, status = instance.pk, instance.status
+    transaction.on_commit(lambda: book_index.set_status([book_id], status))
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book(sender, instance, **kwargs):
+    book_id = instance.pk
+    transaction.on_commit(lambda: book_index.remove_book(book_id))
+
+
+@receiver(post_delete, sender=Genre)
+def unindex_genre(sender, instance, **kwargs):
+    genre_id = instance.pk
+    transaction.on_commit(lambda: book_index.remove_key('genres', genre_id))
+
+
+@receiver(post_delete, sender=Author)
+def unindex_author(sender, instance, **kwargs):
+    author_id = instance.pk
+    transaction.on_commit(lambda: book_index.remove_key('authors', author_id))
+
+
+def _index_relations(field, instance, action, reverse, pk_set):
+    if action == 'post_clear':
+        if reverse:
+            key = instance.pk
+            transaction.on_commit(lambda: book_index.remove_key(field, key))
+        else:
+            book_id = instance.pk
+            transaction.on_commit(lambda: book_index.remove_relations(field, [book_id]))
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    book_ids, keys = (list(pk_set), [instance.pk]) if reverse else ([instance.pk], list(pk_set))
+    if action == 'post_add':
+        transaction.on_commit(lambda: book_index.add_relations(field, book_ids, keys))
+    else:
+        transaction.on_commit(lambda: book_index.remove_relations(field, book_ids, keys))
+
+
+@receiver(m2m_changed, sender=Book.genres.through)
+def index_book_genres(sender, instance, action, reverse, pk_set, **kwargs):
+    _index_relations('genres', instance, action, reverse, pk_set)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_book_authors(sender, instance, action, reverse, pk_set, **kwargs):
+    _index_relations('authors', instance, action, reverse, pk_set)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_detail(sender, instance, **kwargs):
+    book_id = instance.pk
+    transaction.on_commit(lambda: invalidate_book_details([book_id]))
+
+
+@receiver(m2m_changed, sender=Book.genres.through)
+@receiver(m2m_changed, sender=Book.authors.through)
+def invalidate_book_detail_relations(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        book_ids = [instance.pk]
+    elif reverse and action in ('post_add', 'post_remove'):
+        book_ids = list(pk_set)
+    elif reverse and action == 'pre_clear':
+        # Clearing from the genre/author side, so look up the affected books first
+        book_ids = list(instance.book_set.values_list('pk', flat=True))
+    else:
+        return
+    transaction.on_commit(lambda: invalidate_book_details(book_ids))
@@ -1,16 +1,53 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .models import Author, Genre, Book, BookRequest
+import metrics
+from db_router import pinned_to_primary, use_primary
+from throttling import BookRequestCreateThrottle
+
+from .bitmap_index import BitmapIds, book_index
+from .coalescing import book_detail_cache_key, book_detail_flight, invalidate_book_details
+from .events import (
+    LONG_POLL_TIMEOUT, broker, publish_request_events,
+    parse_last_event_id, stream, astream, stream_position
+)
+from .filters import BITMAP_PARAMS, BitmapIndexFilter
+from .models import Author, Genre, Book, BookRequest, Tombstone, ArchivedBookRequest
+from .renderers import EventStreamRenderer
 from .serializers import (
     AuthorSerializer, GenreSerializer,
-    BookSerializer, BookRequestSerializer
+    BookSerializer, BookRequestSerializer,
+    BookRequestBulkModerateSerializer, ArchivedBookRequestSerializer
 )
+from .sync import changes_since, parse_cursor, parse_limit
+
+SYNC_PARAMETERS = [
+    openapi.Parameter(
+        'cursor',
+        openapi.IN_QUERY,
+        description="Cursor returned by the previous call ('<ISO timestamp>,<id>'); omit for a full sync",
+        type=openapi.TYPE_STRING
+    ),
+    openapi.Parameter(
+        'limit',
+        openapi.IN_QUERY,
+        description="Maximum number of changes to return (default 100, max 500)",
+        type=openapi.TYPE_INTEGER
+    ),
+]
 
 
 class AuthorViewSet(viewsets.ModelViewSet):
@@ -55,11 +92,13 @@ class BookViewSet(viewsets.ModelViewSet):
     """
     Managing books.
     Allows listing, creating, updating and deleting books.
-    Supports filtering by status, genre ID and author ID.
+    Supports filtering by status, genre ID and author ID, and by several
+    genres/authors/statuses at once through the bitmap index.
+    Clients can stay in sync through the changes feed.
     """
     queryset = Book.objects.all()
     serializer_class = BookSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, BitmapIndexFilter, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'genres', 'authors']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at', 'title']
@@ -85,6 +124,36 @@ class BookViewSet(viewsets.ModelViewSet):
                 description="Filter by author ID (example: ?authors=1 for specific author)",
                 type=openapi.TYPE_INTEGER
             ),
+            openapi.Parameter(
+                'genres_all',
+                openapi.IN_QUERY,
+                description="Books in every listed genre (example: ?genres_all=1,2)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'genres_any',
+                openapi.IN_QUERY,
+                description="Books in at least one listed genre (example: ?genres_any=1,2)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'authors_all',
+                openapi.IN_QUERY,
+                description="Books by every listed author (example: ?authors_all=1,2)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'authors_any',
+                openapi.IN_QUERY,
+                description="Books by at least one listed author (example: ?authors_any=1,2,3)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'status_any',
+                openapi.IN_QUERY,
+                description="Books with any of the listed statuses (example: ?status_any=available,reserved)",
+                type=openapi.TYPE_STRING
+            ),
             openapi.Parameter(
                 'search',
                 openapi.IN_QUERY,
@@ -111,6 +180,17 @@ class BookViewSet(viewsets.ModelViewSet):
         elif ordering.startswith('descending_'):
             request.query_params._mutable = True
             request.query_params['ordering'] = f"-{ordering.replace('descending_', '')}"
+
+        # Only bitmap filters: page through the matching ids, newest first,
+        # and fetch just the books on the requested page
+        if not set(request.query_params) - {*BITMAP_PARAMS, 'page'}:
+            bitmap = BitmapIndexFilter().get_bitmap(request)
+            if bitmap is not None:
+                page = self.paginate_queryset(BitmapIds(bitmap))
+                books = Book.objects.prefetch_related('authors', 'genres').in_bulk(page)
+                serializer = self.get_serializer([books[i] for i in page if i in books], many=True)
+                return self.get_paginated_response(serializer.data)
+
         return super().list(request, *args, **kwargs)
 
     @swagger_auto_schema(
@@ -138,9 +218,70 @@ class BookViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         return super().create(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        if request.query_params or pinned_to_primary():
+            # Filters apply to the object lookup, and a client pinned after a
+            # write must see it, so neither is served from the cache
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            book_id = int(kwargs['pk'])
+        except ValueError:
+            raise NotFound()
+        # Concurrent misses for the same book share one database load
+        key = book_detail_cache_key(book_id)
+        base_url = request.build_absolute_uri('/')
+        entry = caches['shared'].get(key)
+        if entry is None or entry['base_url'] != base_url:
+            metrics.incr('book_detail.cache_miss')
+            entry = book_detail_flight.do((key, base_url), lambda: self._load_detail(key, base_url))
+        else:
+            metrics.incr('book_detail.cache_hit')
+        return Response(entry['data'])
+
+    def _load_detail(self, key, base_url):
+        # Cover image URLs are absolute, so entries are only valid for one base URL.
+        # Every client is served the entry, so load it from the primary, not a replica
+        with use_primary():
+            entry = {'base_url': base_url, 'data': self.get_serializer(self.get_object()).data}
+        caches['shared'].set(key, entry, settings.BOOK_DETAIL_CACHE_SECONDS)
+        return entry
+
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user, status='available')
 
+    @swagger_auto_schema(
+        manual_parameters=SYNC_PARAMETERS,
+        operation_description="Books created, updated or deleted since the given cursor",
+        responses={
+            200: openapi.Response(
+                description="Changed books, deleted book IDs and the cursor for the next call",
+                examples={
+                    "application/json": {
+                        "results": [],
+                        "deleted": [3],
+                        "cursor": "2024-01-01T12:00:00+00:00,3",
+                        "has_more": False
+                    }
+                }
+            ),
+            400: 'Invalid cursor'
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        changes = changes_since(
+            Book.objects.prefetch_related('authors', 'genres'),
+            Tombstone.objects.filter(model='book'),
+            parse_cursor(request.query_params.get('cursor')),
+            parse_limit(request.query_params.get('limit'))
+        )
+        return Response({
+            "results": self.get_serializer(changes['changed'], many=True).data,
+            "deleted": changes['deleted'],
+            "cursor": changes['cursor'],
+            "has_more": changes['has_more']
+        })
+
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.IsAuthenticated]
@@ -156,13 +297,23 @@ class BookRequestViewSet(viewsets.ModelViewSet):
     - Request available books
     - View their own requests
     - View requests for books they own
+    - Sync their requests through the changes feed
+    - Receive request creations and status changes as they happen
+    - Browse archived (long settled) requests through the history endpoint
     Book owners can:
     - Accept or reject requests for their books
+    - Accept or reject many requests at once
     """
     queryset = BookRequest.objects.all()
     serializer_class = BookRequestSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_throttles(self):
+        throttles = super().get_throttles()
+        if self.action == 'create':
+            throttles.append(BookRequestCreateThrottle())
+        return throttles
+
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return BookRequest.objects.none()
@@ -219,6 +370,10 @@ class BookRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    def perform_create(self, serializer):
+        book_request = serializer.save(requester=self.request.user)
+        publish_request_events('request.created', [book_request.id])
+
     @swagger_auto_schema(
         method='post',
         operation_description="Accept a book request (only for book owners)",
@@ -258,7 +413,15 @@ class BookRequestViewSet(viewsets.ModelViewSet):
         book_request.book.save()
 
         # Reject other pending requests
-        book_request.book.requests.exclude(id=book_request.id).update(status='rejected')
+        siblings = book_request.book.requests.exclude(id=book_request.id)
+        sibling_ids = list(siblings.filter(status='pending').values_list('id', flat=True))
+        siblings.update(
+            status='rejected',
+            updated_at=timezone.now()
+        )
+
+        publish_request_events('request.accepted', [book_request.id])
+        publish_request_events('request.rejected', sibling_ids)
 
         return Response({
             "status": "request accepted",
@@ -299,4 +462,227 @@ class BookRequestViewSet(viewsets.ModelViewSet):
 
         book_request.status = 'rejected'
         book_request.save()
+        publish_request_events('request.rejected', [book_request.id])
         return Response({"status": "request rejected"})
+
+    @swagger_auto_schema(
+        manual_parameters=SYNC_PARAMETERS,
+        operation_description="Your requests created, updated or deleted since the given cursor",
+        responses={
+            200: openapi.Response(
+                description="Changed requests, deleted request IDs and the cursor for the next call",
+                examples={
+                    "application/json": {
+                        "results": [],
+                        "deleted": [5],
+                        "cursor": "2024-01-01T12:00:00+00:00,5",
+                        "has_more": False
+                    }
+                }
+            ),
+            400: 'Invalid cursor'
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        user = request.user
+        changes = changes_since(
+            self.get_queryset().select_related('book', 'requester'),
+            Tombstone.objects.filter(model='bookrequest').filter(
+                Q(owner_id=user.id) | Q(requester_id=user.id)
+            ),
+            parse_cursor(request.query_params.get('cursor')),
+            parse_limit(request.query_params.get('limit'))
+        )
+        return Response({
+            "results": self.get_serializer(changes['changed'], many=True).data,
+            "deleted": changes['deleted'],
+            "cursor": changes['cursor'],
+            "has_more": changes['has_more']
+        })
+
+    @swagger_auto_schema(
+        operation_description="Archived requests for your books and your archived requests, newest first"
+    )
+    @action(detail=False, methods=['get'], serializer_class=ArchivedBookRequestSerializer)
+    def history(self, request):
+        user = request.user
+        queryset = ArchivedBookRequest.objects.filter(
+            Q(book__owner=user) | Q(requester=user)
+        ).select_related('book', 'requester').order_by('-updated_at', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(
+        method='post',
+        request_body=BookRequestBulkModerateSerializer,
+        operation_description="Accept or reject many book requests at once (only for book owners). "
+                              "At most one request per book can be accepted; accepting a request "
+                              "rejects the other pending requests for that book.",
+        responses={
+            200: openapi.Response(
+                description="Per-request results",
+                examples={
+                    "application/json": {
+                        "results": [
+                            {"id": 1, "status": "accepted"},
+                            {"id": 2, "status": "rejected"},
+                            {"id": 3, "error": "Can only reject pending requests"}
+                        ]
+                    }
+                }
+            ),
+            400: 'Invalid input',
+            403: 'Authentication required'
+        }
+    )
+    @action(detail=False, methods=['post'], url_path='bulk-moderate')
+    def bulk_moderate(self, request):
+        serializer = BookRequestBulkModerateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        accept_ids = list(dict.fromkeys(serializer.validated_data['accept']))
+        reject_ids = list(dict.fromkeys(serializer.validated_data['reject']))
+
+        results = {}
+        for request_id in set(accept_ids) & set(reject_ids):
+            results[request_id] = {"error": "Cannot both accept and reject a request"}
+
+        with transaction.atomic():
+            rows = {
+                row['id']: row
+                for row in BookRequest.objects.select_for_update().filter(
+                    id__in=[i for i in accept_ids + reject_ids if i not in results]
+                ).values('id', 'status', 'requester_id', 'book_id', 'book__owner_id', 'book__status')
+            }
+
+            accepted = {}  # book id -> request id
+            for request_id in accept_ids:
+                if request_id in results:
+                    continue
+                row = rows.get(request_id)
+                error = self._moderation_error(row, request.user, 'accept')
+                if error is None and row['book_id'] in accepted:
+                    # Rejected below with the book's other pending requests
+                    results[request_id] = {"status": "rejected"}
+                    continue
+                if error is None and row['book__status'] != 'available':
+                    error = "Book is not available for requests"
+                if error is None:
+                    accepted[row['book_id']] = request_id
+                    results[request_id] = {"status": "accepted"}
+                else:
+                    results[request_id] = {"error": error}
+
+            rejected = []
+            for request_id in reject_ids:
+                if request_id in results:
+                    continue
+                error = self._moderation_error(rows.get(request_id), request.user, 'reject')
+                if error is None:
+                    rejected.append(request_id)
+                    results[request_id] = {"status": "rejected"}
+                else:
+                    results[request_id] = {"error": error}
+
+            now = timezone.now()
+            if accepted:
+                BookRequest.objects.filter(id__in=accepted.values()).update(status='accepted', updated_at=now)
+                Book.objects.filter(id__in=accepted.keys()).update(status='lent', updated_at=now)
+                lent_ids = list(accepted.keys())
+                transaction.on_commit(lambda: book_index.set_status(lent_ids, 'lent'))
+                transaction.on_commit(lambda: invalidate_book_details(lent_ids))
+                # Reject other pending requests
+                sibling_ids = list(
+                    BookRequest.objects.filter(book_id__in=accepted.keys(), status='pending').exclude(
+                        id__in=accepted.values()
+                    ).values_list('id', flat=True)
+                )
+                BookRequest.objects.filter(id__in=sibling_ids).update(status='rejected', updated_at=now)
+                rejected.extend(i for i in sibling_ids if i not in rejected)
+            if rejected:
+                BookRequest.objects.filter(id__in=rejected, status='pending').update(status='rejected', updated_at=now)
+
+            publish_request_events('request.accepted', accepted.values())
+            publish_request_events('request.rejected', rejected)
+
+        return Response({
+            "results": [
+                {"id": request_id, **results[request_id]}
+                for request_id in dict.fromkeys(accept_ids + reject_ids)
+            ]
+        })
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                'last_event_id',
+                openapi.IN_QUERY,
+                description="Resume after this event (the Last-Event-ID header takes precedence)",
+                type=openapi.TYPE_STRING
+            ),
+            openapi.Parameter(
+                'timeout',
+                openapi.IN_QUERY,
+                description="Long-poll only: seconds to wait for an event (max 25)",
+                type=openapi.TYPE_NUMBER
+            ),
+        ],
+        operation_description="Stream request creations and status changes for your requests and books. "
+                              "Send 'Accept: text/event-stream' for Server-Sent Events; "
+                              "otherwise the call long-polls and returns JSON.",
+        responses={
+            200: openapi.Response(
+                description="Events after the given id",
+                examples={
+                    "application/json": {
+                        "events": [
+                            {"id": "3f2a9c1e-42", "event": "request.accepted",
+                             "data": {"id": 1, "book": 1, "status": "accepted"}}
+                        ],
+                        "last_event_id": "3f2a9c1e-42"
+                    }
+                }
+            ),
+            403: 'Authentication required'
+        }
+    )
+    @action(
+        detail=False,
+        methods=['get'],
+        renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, EventStreamRenderer]
+    )
+    def events(self, request):
+        last_event_id = parse_last_event_id(request)
+
+        if isinstance(request.accepted_renderer, EventStreamRenderer):
+            if isinstance(request._request, ASGIRequest):
+                content = astream(request.user.id, last_event_id)
+            else:
+                content = stream(request.user.id, last_event_id)
+            response = StreamingHttpResponse(content, content_type='text/event-stream')
+            response['Cache-Control'] = 'no-cache'
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        try:
+            timeout = float(request.query_params.get('timeout', LONG_POLL_TIMEOUT))
+        except ValueError:
+            raise ValidationError({"timeout": "Expected a number"})
+        events, position = broker.wait(
+            request.user.id, stream_position(last_event_id), max(0, min(timeout, LONG_POLL_TIMEOUT))
+        )
+        return Response({
+            "events": events,
+            "last_event_id": broker.event_id(position)
+        })
+
+    @staticmethod
+    def _moderation_error(row, user, verb):
+        if row is None or user.id not in (row['book__owner_id'], row['requester_id']):
+            return "Request not found"
+        if row['book__owner_id'] != user.id:
+            return f"Only the book owner can {verb} requests"
+        if row['status'] != 'pending':
+            return f"Can only {verb} pending requests"
+        return None
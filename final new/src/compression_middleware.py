@@ -0,0 +1,184 @@
+"""
+Response compression with zstd, brotli or gzip, whichever the client accepts
+first in that order. zstd and brotli are used only when the zstandard and
+brotli packages are installed.
+
+Large compressed bodies are cached by content hash, so a popular page is
+compressed once and then served from the cache until it changes. Bodies over
+COMPRESSION_CACHE_MAX_SIZE, such as exports, are not cached, which bounds the
+memory the cache can hold per worker.
+"""
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content that is already compressed or must not be buffered
+SKIPPED_CONTENT_TYPES = {
+    'application/gzip',
+    'application/x-gzip',
+    'application/zip',
+    'application/x-7z-compressed',
+    'application/x-rar-compressed',
+    'application/zstd',
+    'font/woff',
+    'font/woff2',
+    'text/event-stream',
+}
+SKIPPED_CONTENT_PREFIXES = ('image/', 'video/', 'audio/')
+COMPRESSIBLE_IMAGES = {'image/svg+xml'}
+
+GZIP_MAX_RANDOM_BYTES = 100
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def _gzip_compress(body):
+    # Random padding mitigates BREACH-style attacks, as in Django's GZipMiddleware
+    return compress_string(body, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def _gzip_stream():
+    compressor = zlib.compressobj(wbits=31)
+    return lambda chunk: compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+
+
+def _brotli_stream():
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    return lambda chunk: compressor.process(chunk) + compressor.flush(), compressor.finish
+
+
+def _zstd_stream():
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return (
+        lambda chunk: compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK),
+        compressor.flush
+    )
+
+
+ENCODINGS = {}
+if zstandard is not None:
+    ENCODINGS['zstd'] = (lambda body: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), _zstd_stream)
+if brotli is not None:
+    ENCODINGS['br'] = (lambda body: brotli.compress(body, quality=BROTLI_QUALITY), _brotli_stream)
+ENCODINGS['gzip'] = (_gzip_compress, _gzip_stream)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Return the first supported encoding the Accept-Encoding header allows.
+    """
+    accepted = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def _is_compressible(content_type):
+    content_type = content_type.split(';')[0].strip().lower()
+    if content_type in COMPRESSIBLE_IMAGES:
+        return True
+    return content_type not in SKIPPED_CONTENT_TYPES and not content_type.startswith(SKIPPED_CONTENT_PREFIXES)
+
+
+def _compress_sequence(sequence, stream_factory):
+    compress, finish = stream_factory()
+    for chunk in sequence:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def _acompress_sequence(sequence, stream_factory):
+    compress, finish = stream_factory()
+    async for chunk in sequence:
+        data = compress(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least COMPRESSION_MIN_SIZE bytes. Bodies of
+    COMPRESSION_CACHE_MIN_SIZE to COMPRESSION_CACHE_MAX_SIZE bytes are
+    compressed once and then served from the 'compression' cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or not _is_compressible(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compress, stream_factory = ENCODINGS[encoding]
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = _acompress_sequence(response.streaming_content, stream_factory)
+            else:
+                response.streaming_content = _compress_sequence(response.streaming_content, stream_factory)
+            # The compressed size is unknown until the stream ends
+            del response.headers['Content-Length']
+        else:
+            compressed = self._compress(response.content, encoding, compress)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # A compressed body is not byte-for-byte the same, so make strong ETags weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress(self, body, encoding, compress):
+        if not settings.COMPRESSION_CACHE_MIN_SIZE <= len(body) <= settings.COMPRESSION_CACHE_MAX_SIZE:
+            return compress(body)
+
+        cache = caches['compression']
+        key = f'{encoding}:{hashlib.blake2b(body, digest_size=16).hexdigest()}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = compress(body)
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TIMEOUT)
+        return compressed
@@ -0,0 +1,116 @@
+"""
+Read/write splitting between the primary database and read replicas.
+
+Reads go to a replica only while ReplicaRoutingMiddleware is handling a safe
+request; everything else (writes, transactions, management commands, requests
+from a client that wrote recently) uses the primary.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'use_primary_db'
+
+_routing = ContextVar('db_routing', default=None)
+
+
+def _replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def pinned_to_primary():
+    """
+    Return True when replicas are configured but the current request reads
+    from the primary, because it is unsafe, it wrote, or its client wrote
+    recently.
+    """
+    state = _routing.get()
+    return bool(state) and not state['use_replica'] and bool(_replicas())
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, e.g. to fill a cache that clients
+    reading from any database are served from.
+    """
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _routing.get()
+        replicas = _replicas()
+        if not state or not state['use_replica'] or not replicas:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing.get()
+        if state:
+            # Read your own writes for the rest of the request
+            state['use_replica'] = False
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in _replicas():
+            return False
+        return None
+
+
+def _credential_pin_key(request):
+    # API clients often keep no cookies, so also pin the credential they send
+    credential = request.META.get('HTTP_AUTHORIZATION')
+    if not credential:
+        return None
+    return f"db-pin:{hashlib.sha256(credential.encode()).hexdigest()}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Allows replica reads for safe requests and pins a client to the primary
+    for REPLICA_PIN_SECONDS after it writes, so it sees its own changes. The
+    client is recognised by a cookie and, for clients that drop cookies, by
+    its Authorization header, remembered in the 'shared' cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pin_key = _credential_pin_key(request) if _replicas() else None
+        pinned = PIN_COOKIE in request.COOKIES or (
+            pin_key is not None and request.method in SAFE_METHODS and caches['shared'].get(pin_key) is not None
+        )
+        state = {
+            'use_replica': request.method in SAFE_METHODS and not pinned,
+            'wrote': False,
+        }
+        token = _routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if state['wrote'] and _replicas():
+            pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 15)
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds, httponly=True, samesite='Lax')
+            if pin_key is not None:
+                caches['shared'].set(pin_key, 1, pin_seconds)
+        return response
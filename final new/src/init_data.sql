@@ -4,6 +4,8 @@ PRAGMA foreign_keys = OFF;
 DELETE FROM book_genres;
 DELETE FROM book_authors;
 DELETE FROM book_request;
+DELETE FROM book_request_archive;
+DELETE FROM tombstone;
 DELETE FROM book;
 DELETE FROM author;
 DELETE FROM genre;
@@ -17,9 +19,9 @@ PRAGMA foreign_keys = ON;
 
 -- Now insert data in correct order without explicit IDs
 INSERT INTO user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined,
-                  location)
+                  location, token_version)
 VALUES ('pbkdf2_sha256$870000$UWXAa026eUO7wOA5Z5gJlz$+1kygHX3XpcwwGzB+OGyL2/a2neObyUBAXOPcRBnrnw=',
-        1, 'test', 'test', 'test', 'test@test.com', 0, 1, CURRENT_TIMESTAMP, 'Test City');
+        1, 'test', 'test', 'test', 'test@test.com', 0, 1, CURRENT_TIMESTAMP, 'Test City', 0);
 
 INSERT INTO author (name, biography)
 VALUES ('Konstantine Gamsakhurdia', 'Georgian author'),
@@ -0,0 +1,39 @@
+"""
+In-process counters for cache, coalescing and throttling behaviour.
+Counters are per worker and reset on restart.
+"""
+import threading
+from collections import Counter
+
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+_lock = threading.Lock()
+_counters = Counter()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot():
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+
+
+class MetricsView(APIView):
+    """
+    Counters of this worker (staff only).
+    """
+    permission_classes = [permissions.IsAdminUser]
+    throttle_classes = []
+
+    def get(self, request):
+        return Response(snapshot())
@@ -1,4 +1,5 @@
 from pathlib import Path
+import importlib.util
 import os
 from datetime import timedelta
 
@@ -24,6 +25,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'compression_middleware.CompressionMiddleware',
+    'db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -56,6 +59,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'wsgi.application'
+ASGI_APPLICATION = 'asgi.application'
 
 DATABASES = {
     'default': {
@@ -64,10 +68,60 @@ DATABASES = {
     }
 }
 
+# Comma-separated SQLite files used as read replicas, e.g. DATABASE_REPLICAS=replica1.sqlite3
+REPLICA_DATABASES = []
+for index, path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['db_router.ReplicaRouter']
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 15))
+
+# SQLite files with host-wide state shared by every worker process
+CACHE_DIR = Path(os.environ.get('CACHE_DIR', BASE_DIR / '.cache'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'compression': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'compression',
+        'OPTIONS': {'MAX_ENTRIES': 500},
+    },
+    # Entries that must be invalidated in every worker at once, in CACHE_DIR
+    'shared': {
+        'BACKEND': 'shared_store.SQLiteCache',
+        'LOCATION': 'shared.sqlite3',
+    },
+}
+
+# Seconds a serialized book detail stays cached
+BOOK_DETAIL_CACHE_SECONDS = int(os.environ.get('BOOK_DETAIL_CACHE_SECONDS', 60))
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = 512
+# Compressed bodies at least this large are cached by content hash
+COMPRESSION_CACHE_MIN_SIZE = 4096
+# Larger bodies are compressed on every response, so the cache stays within
+# about 500 entries of this size per worker
+COMPRESSION_CACHE_MAX_SIZE = 256 * 1024
+COMPRESSION_CACHE_TIMEOUT = 300
+
 AUTH_USER_MODEL = 'users.User'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Build request.user from JWT claims instead of loading it on every request
+JWT_STATELESS_USER = int(os.environ.get('JWT_STATELESS_USER', 0))
+# Seconds a worker trusts its cached copy of a user's token version
+JWT_TOKEN_STATE_CACHE_SECONDS = int(os.environ.get('JWT_TOKEN_STATE_CACHE_SECONDS', 60))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -76,18 +130,59 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'users.authentication.StatelessJWTAuthentication' if JWT_STATELESS_USER
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication'
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'books.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'books.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'throttling.AnonTokenBucketThrottle',
+        'throttling.UserTokenBucketThrottle',
+        'throttling.WriteTokenBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.environ.get('THROTTLE_RATE_ANON', '120/min'),
+        'user': os.environ.get('THROTTLE_RATE_USER', '600/min'),
+        'write': os.environ.get('THROTTLE_RATE_WRITE', '60/min'),
+        'request_create': os.environ.get('THROTTLE_RATE_REQUEST_CREATE', '20/hour'),
+    },
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10
 }
 
+# MessagePack is only offered when msgpack is installed
+if importlib.util.find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'books.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'books.parsers.MessagePackParser')
+
+# The changes feed only returns changes older than this, so transactions that
+# commit late are not skipped
+CHANGES_FEED_LAG_SECONDS = int(os.environ.get('CHANGES_FEED_LAG_SECONDS', 10))
+
+# Tombstones of deleted books and requests are purged after this many days;
+# changes feed cursors older than that must sync again from scratch
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30))
+
+# Settled book requests older than this are moved to the archive table
+BOOK_REQUEST_ARCHIVE_DAYS = int(os.environ.get('BOOK_REQUEST_ARCHIVE_DAYS', 90))
+
+# Seconds before a worker rebuilds its book bitmap index from the database
+BOOK_INDEX_TTL = int(os.environ.get('BOOK_INDEX_TTL', 300))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    'TOKEN_OBTAIN_SERIALIZER': 'users.serializers.TokenObtainPairSerializer',
 }
 
 STATIC_URL = '/static/'
@@ -0,0 +1,141 @@
+"""
+SQLite files in CACHE_DIR shared by every worker process on the host.
+
+SQLiteCache is a cache backend on top of them. Its writes cost O(1), unlike
+FileBasedCache, which lists its whole directory to cull entries on every set.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Seconds between sweeps of expired cache entries
+PRUNE_INTERVAL = 60
+
+
+class SQLiteFile:
+    """
+    A SQLite database in CACHE_DIR. Connections are opened lazily per thread,
+    so each worker process opens its own after forking, and are reopened when
+    CACHE_DIR changes.
+    """
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.schema = schema
+        self._local = threading.local()
+
+    def connection(self):
+        path = Path(settings.CACHE_DIR) / self.name
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.path != path:
+            if connection is not None:
+                connection.close()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(self.schema)
+            self._local.connection, self._local.path = connection, path
+        return connection
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def transaction(self):
+        """
+        Return a context manager running its block in an IMMEDIATE transaction,
+        which holds the database's write lock from the start.
+        """
+        return _Transaction(self.connection())
+
+
+class _Transaction:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, tb):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache backend keeping pickled values in the CACHE_DIR file named by
+    LOCATION. Expired entries are deleted every PRUNE_INTERVAL seconds instead
+    of being culled on each write, so MAX_ENTRIES does not apply.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._file = SQLiteFile(
+            location,
+            'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+        )
+        self._pruned_at = 0
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        cursor = self._file.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE expires <= ?',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout), now)
+        )
+        self._prune(now)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._file.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._file.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self.get_backend_timeout(timeout))
+        )
+        self._prune(time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._file.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._file.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        with self._file.transaction() as connection:
+            row = connection.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] <= time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?', (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key)
+            )
+        return value
+
+    def clear(self):
+        self._file.execute('DELETE FROM cache')
+
+    def _prune(self, now):
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = now
+            self._file.execute('DELETE FROM cache WHERE expires <= ?', (now,))
@@ -0,0 +1,21 @@
+import pytest
+from django.core.cache import caches
+from django.test import override_settings
+
+from throttling import bucket_store
+
+
+@pytest.fixture(autouse=True, scope='session')
+def cache_dir(tmp_path_factory):
+    # Keep the shared state of a server running from this checkout out of the tests
+    path = tmp_path_factory.mktemp('cache')
+    with override_settings(CACHE_DIR=path):
+        yield path
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # Token buckets and cached book details must not leak between tests
+    for alias in ('default', 'shared'):
+        caches[alias].clear()
+    bucket_store.clear()
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from books.models import Book, BookRequest, ArchivedBookRequest, Tombstone
+
+
+class ArchiveBookRequestsTest(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@test.com', password='testpass123'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.owner, pickup_location='Test Location'
+        )
+        old = timezone.now() - timedelta(days=120)
+        self.accepted = BookRequest.objects.create(book=self.book, requester=self.reader, status='accepted')
+        self.rejected = BookRequest.objects.create(book=self.book, requester=self.reader, status='rejected')
+        self.pending = BookRequest.objects.create(book=self.book, requester=self.reader)
+        self.recent = BookRequest.objects.create(book=self.book, requester=self.reader, status='rejected')
+        BookRequest.objects.filter(
+            id__in=[self.accepted.id, self.rejected.id, self.pending.id]
+        ).update(updated_at=old)
+
+    def test_command_moves_old_settled_requests(self):
+        out = StringIO()
+        call_command('archive_book_requests', days=90, batch_size=1, stdout=out)
+        self.assertIn('Archived 2 book requests.', out.getvalue())
+        self.assertEqual(
+            set(BookRequest.objects.values_list('id', flat=True)),
+            {self.pending.id, self.recent.id}
+        )
+        archived = ArchivedBookRequest.objects.get(id=self.accepted.id)
+        self.assertEqual(archived.status, 'accepted')
+        self.assertEqual(archived.requester, self.reader)
+        self.assertFalse(Tombstone.objects.exists())
+
+    def test_history_endpoint_reads_archive(self):
+        call_command('archive_book_requests', days=90, stdout=StringIO())
+
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.get(reverse('bookrequest-history'))
+        self.assertEqual(
+            [r['id'] for r in response.data['results']],
+            [self.rejected.id, self.accepted.id]
+        )
+        self.assertEqual(response.data['results'][0]['book_title'], 'Test Book')
+
+        response = self.client.get(reverse('bookrequest-list'))
+        self.assertEqual(
+            {r['id'] for r in response.data['results']},
+            {self.pending.id, self.recent.id}
+        )
+
+        stranger = get_user_model().objects.create_user(
+            username='stranger', email='stranger@test.com', password='testpass123'
+        )
+        self.client.force_authenticate(user=stranger)
+        response = self.client.get(reverse('bookrequest-history'))
+        self.assertEqual(response.data['results'], [])
@@ -0,0 +1,135 @@
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from books.bitmap_index import BitmapIds, BookBitmapIndex, book_index
+from books.models import Author, Book, Genre
+from db_router import ReplicaRoutingMiddleware
+
+
+class BitmapIdsTest(SimpleTestCase):
+    def test_newest_first_slices(self):
+        ids = BitmapIds(1 << 3 | 1 << 7 | 1 << 20)
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids[0:2], [20, 7])
+        self.assertEqual(ids[1:10], [7, 3])
+        self.assertEqual(list(BitmapIds(0)), [])
+
+
+class BitmapIndexFilterTest(APITestCase):
+    def setUp(self):
+        book_index.invalidate()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        self.fantasy = Genre.objects.create(name='Fantasy')
+        self.scifi = Genre.objects.create(name='Sci-fi')
+        self.first_author = Author.objects.create(name='First Author')
+        self.second_author = Author.objects.create(name='Second Author')
+
+        self.both = self.create_book('Both', [self.fantasy, self.scifi], [self.first_author])
+        self.fantasy_only = self.create_book('Fantasy', [self.fantasy], [self.second_author])
+        self.scifi_lent = self.create_book('Sci-fi', [self.scifi], [self.second_author], status='lent')
+        self.url = reverse('book-list')
+
+    def create_book(self, title, genres, authors, status='available'):
+        book = Book.objects.create(
+            title=title, description='Test Description', owner=self.user,
+            pickup_location='Test Location', status=status
+        )
+        book.genres.set(genres)
+        book.authors.set(authors)
+        return book
+
+    def titles(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book['title'] for book in response.data['results']]
+
+    def test_and_or_filters(self):
+        self.assertEqual(self.titles({'genres_all': f'{self.fantasy.id},{self.scifi.id}'}), ['Both'])
+        self.assertEqual(
+            self.titles({'genres_any': f'{self.fantasy.id},{self.scifi.id}'}),
+            ['Sci-fi', 'Fantasy', 'Both']
+        )
+        self.assertEqual(
+            self.titles({'genres_any': self.scifi.id, 'status_any': 'available'}),
+            ['Both']
+        )
+        self.assertEqual(
+            self.titles({'authors_any': f'{self.first_author.id},{self.second_author.id}',
+                         'genres_all': self.fantasy.id}),
+            ['Fantasy', 'Both']
+        )
+
+    def test_combined_with_search(self):
+        self.assertEqual(
+            self.titles({'genres_any': self.fantasy.id, 'search': 'Both'}),
+            ['Both']
+        )
+
+    def test_invalid_ids(self):
+        response = self.client.get(self.url, {'genres_all': 'fantasy'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_only_the_page_is_fetched(self):
+        for i in range(12):
+            self.create_book(f'Extra {i}', [self.fantasy], [])
+        self.client.get(self.url, {'genres_any': self.fantasy.id})
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'genres_any': self.fantasy.id, 'page': 2})
+        self.assertEqual(response.data['count'], 14)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_signals_keep_index_current(self):
+        book_index.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fantasy_only.genres.add(self.scifi)
+            self.both.genres.remove(self.scifi)
+            self.scifi_lent.status = 'available'
+            self.scifi_lent.save()
+        self.assertEqual(
+            self.titles({'genres_all': self.scifi.id, 'status_any': 'available'}),
+            ['Sci-fi', 'Fantasy']
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fantasy_only.delete()
+            self.scifi.book_set.clear()
+        self.assertEqual(self.titles({'genres_any': self.scifi.id}), [])
+        self.assertEqual(self.titles({'genres_any': self.fantasy.id}), ['Both'])
+
+    def test_changes_from_other_workers_trigger_rebuild(self):
+        self.assertEqual(self.titles({'status_any': 'lent'}), ['Sci-fi'])
+        # Another worker lends a book; this worker sees no signal for it
+        Book.objects.filter(pk=self.both.pk).update(status='lent')
+        BookBitmapIndex().set_status([self.both.pk], 'lent')
+        self.assertEqual(self.titles({'status_any': 'lent'}), ['Sci-fi', 'Both'])
+
+
+class BitmapIndexReplicaTest(APITransactionTestCase):
+    def setUp(self):
+        book_index.invalidate()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.user, pickup_location='Test Location'
+        )
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_rebuilds_from_primary(self):
+        # replica1 is not configured, so reading it would raise
+        resolved = []
+
+        def view(request):
+            resolved.append(book_index.resolve(statuses=['available']))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(RequestFactory().get('/api/books/'))
+        self.assertEqual(resolved, [1 << self.book.pk])
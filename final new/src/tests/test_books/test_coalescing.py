@@ -0,0 +1,214 @@
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+import metrics
+from books.coalescing import SingleFlight, book_detail_cache_key
+from books.models import Book, Genre
+from db_router import PIN_COOKIE
+from shared_store import SQLiteCache
+from throttling import TokenBucketStore, bucket_store
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+
+    def test_concurrent_callers_share_one_computation(self):
+        flight = SingleFlight('test')
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.1)
+            return 'result'
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+        leader.start()
+        started.wait()
+        followers = [
+            threading.Thread(target=lambda: results.append(flight.do('key', compute)))
+            for _ in range(5)
+        ]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ['result'] * 6)
+        self.assertEqual(metrics.snapshot()['test.coalesced'], 5)
+
+    def test_errors_are_not_cached(self):
+        flight = SingleFlight('test')
+
+        def fail():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'retried'), 'retried')
+
+
+class BookDetailCacheTest(APITestCase):
+    def setUp(self):
+        metrics.reset()
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.user, pickup_location='Test Location'
+        )
+        self.url = reverse('book-detail', args=[self.book.id])
+
+    def test_detail_is_cached_and_invalidated(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Test Book')
+        self.assertEqual(metrics.snapshot()['book_detail.cache_hit'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.title = 'Renamed'
+            self.book.save()
+        self.assertEqual(self.client.get(self.url).data['title'], 'Renamed')
+
+        genre = Genre.objects.create(name='Fantasy')
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.book_set.add(self.book)
+        self.assertEqual(self.client.get(self.url).data['genres'][0]['name'], 'Fantasy')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            genre.book_set.clear()
+        self.assertEqual(self.client.get(self.url).data['genres'], [])
+
+    def test_invalidation_reaches_other_workers(self):
+        self.client.get(self.url)
+        # Another process on the host opens the same cache file
+        other_worker = SQLiteCache(settings.CACHES['shared']['LOCATION'], {})
+        key = book_detail_cache_key(self.book.id)
+        self.assertEqual(other_worker.get(key)['data']['title'], 'Test Book')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save()
+        self.assertIsNone(other_worker.get(key))
+
+    def test_equivalent_ids_share_an_entry(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/books/0{self.book.id}/')
+        self.assertEqual(response.data['id'], self.book.id)
+
+    def test_missing_book(self):
+        response = self.client.get(reverse('book-detail', args=[999999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+# 'replica1' is not a configured database, so any read routed to it fails.
+# Transaction test cases are needed because reads in a transaction use the primary.
+@override_settings(REPLICA_DATABASES=['replica1'])
+class BookDetailReplicaTest(APITransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.user, pickup_location='Test Location'
+        )
+        self.url = reverse('book-detail', args=[self.book.id])
+
+    def test_cached_detail_is_loaded_from_primary(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Test Book')
+
+    def test_pinned_clients_bypass_the_cache(self):
+        self.client.get(self.url)
+        # Changed without signals, so the cached entry is stale
+        Book.objects.filter(pk=self.book.pk).update(title='Renamed')
+        self.assertEqual(self.client.get(self.url).data['title'], 'Test Book')
+
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.client.get(self.url).data['title'], 'Renamed')
+
+
+class ThrottleTest(APITestCase):
+    def setUp(self):
+        metrics.reset()
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@test.com', password='testpass123'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@test.com', password='testpass123'
+        )
+        self.books = [
+            Book.objects.create(
+                title=f'Book {i}', description='Test Description',
+                owner=self.owner, pickup_location='Test Location'
+            )
+            for i in range(3)
+        ]
+
+    def test_anonymous_reads_are_throttled(self):
+        rates = {'anon': '2/min', 'user': '600/min', 'write': '60/min', 'request_create': '20/hour'}
+        with mock.patch('rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES', rates):
+            responses = [self.client.get(reverse('book-list')) for _ in range(3)]
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS]
+        )
+        self.assertIn('Retry-After', responses[2])
+        self.assertEqual(metrics.snapshot()['throttle.anon.throttled'], 1)
+
+    def test_request_creation_has_a_tighter_limit(self):
+        rates = {'anon': '120/min', 'user': '600/min', 'write': '60/min', 'request_create': '2/hour'}
+        self.client.force_authenticate(user=self.reader)
+        with mock.patch('rest_framework.settings.api_settings.DEFAULT_THROTTLE_RATES', rates):
+            responses = [
+                self.client.post(reverse('bookrequest-list'), {'book': book.id, 'message': 'Please'}, format='json')
+                for book in self.books
+            ]
+            listing = self.client.get(reverse('bookrequest-list'))
+        self.assertEqual(
+            [response.status_code for response in responses],
+            [status.HTTP_201_CREATED, status.HTTP_201_CREATED, status.HTTP_429_TOO_MANY_REQUESTS]
+        )
+        self.assertEqual(listing.status_code, status.HTTP_200_OK)
+        self.assertEqual(metrics.snapshot()['throttle.request_create.throttled'], 1)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        self.reader.is_staff = True
+        self.client.force_authenticate(user=self.reader)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_200_OK)
+
+    def test_buckets_are_shared_between_workers(self):
+        # Each store stands in for a worker process with its own connection
+        workers = [TokenBucketStore() for _ in range(4)]
+        allowed = []
+
+        def take():
+            store = workers.pop()
+            for _ in range(50):
+                allowed.append(store.take('anon:shared', 100, 1 / 3600)[0])
+
+        threads = [threading.Thread(target=take) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(allowed.count(True), 100)
+        self.assertFalse(bucket_store.take('anon:shared', 100, 1 / 3600)[0])
+
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from books.events import EventBroker, broker, stream, astream
+from books.models import Book, BookRequest
+
+
+class EventBrokerTest(SimpleTestCase):
+    def setUp(self):
+        # A fresh log per test; brokers opening the same log stand in for workers
+        self.log = f'{self.id()}.sqlite3'
+        self.broker = EventBroker(self.log)
+        self.start = self.broker.last_seq
+
+    def test_events_are_delivered_per_user(self):
+        first = self.broker.publish([1, 2], 'request.created', {'id': 1})
+        self.broker.publish([2], 'request.created', {'id': 2})
+        events, position = self.broker.wait(1, self.start, timeout=0)
+        self.assertEqual(events, [first[1]])
+        self.assertEqual(len(self.broker.wait(2, self.start, timeout=0)[0]), 2)
+        self.assertEqual(self.broker.wait(1, self.broker.position(first[1]['id']), timeout=0), ([], position))
+
+    def test_long_backlogs_are_delivered_in_batches(self):
+        broker = EventBroker(self.log, batch_size=2)
+        events = [broker.publish([1], 'request.created', {'id': i})[1] for i in range(3)]
+        received, position = broker.wait(1, self.start, timeout=0)
+        self.assertEqual(received, events[:2])
+        self.assertEqual(broker.wait(1, position, timeout=0)[0], events[2:])
+
+    def test_events_reach_other_workers(self):
+        other_worker = EventBroker(self.log, poll_interval=0.05)
+        position = other_worker.position(None)
+        threading.Timer(0.1, self.broker.publish, ([1], 'request.accepted', {'id': 7})).start()
+        started = time.monotonic()
+        events, _ = other_worker.wait(1, position, timeout=5)
+        self.assertEqual([(e['event'], e['data']) for e in events], [('request.accepted', {'id': 7})])
+        self.assertLess(time.monotonic() - started, 1)
+        # Ids are valid on every worker
+        self.assertEqual(self.broker.position(events[0]['id']), other_worker.position(events[0]['id']))
+
+    def test_reset_when_events_were_pruned(self):
+        broker = EventBroker(self.log, retention_seconds=0)
+        broker.publish([1], 'request.created', {'id': 1})
+        with mock.patch('books.events.time.time', return_value=time.time() + 3600):
+            event = broker.publish([1], 'request.created', {'id': 2})[1]
+        received, _ = broker.wait(1, self.start, timeout=0)
+        self.assertEqual([e['event'] for e in received], ['reset', 'request.created'])
+        self.assertEqual(received[1], event)
+
+    def test_reset_for_ids_from_other_logs(self):
+        other = EventBroker(f'{self.id()}-other.sqlite3')
+        for _ in range(5):
+            other.publish([1], 'request.created', {})
+        event = self.broker.publish([1], 'request.created', {})[1]
+        for last_event_id in (other.event_id(1), self.broker.event_id(99), 'garbage'):
+            received, _ = self.broker.wait(1, self.broker.position(last_event_id), timeout=0)
+            self.assertEqual([e['event'] for e in received], ['reset', 'request.created'])
+            self.assertEqual(received[1], event)
+
+    def test_async_wait_is_woken_by_publish_from_another_thread(self):
+        async def wait():
+            threading.Timer(0.05, self.broker.publish, ([1], 'request.created', {})).start()
+            return await self.broker.await_events(1, self.start, timeout=5)
+
+        started = time.monotonic()
+        events, _ = asyncio.run(wait())
+        self.assertEqual([e['event'] for e in events], ['request.created'])
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+class EventStreamTest(SimpleTestCase):
+    def test_stream_resumes_and_sends_heartbeats(self):
+        position = broker.event_id(broker.last_seq)
+        event = broker.publish([42], 'request.accepted', {'id': 7})[42]
+        chunks = list(stream(42, position, duration=0.05, heartbeat=0.01))
+        self.assertTrue(chunks[0].startswith('retry:'))
+        self.assertIn(f"id: {event['id']}\nevent: request.accepted\n", chunks[1])
+        self.assertIn(': heartbeat\n\n', chunks[2:])
+
+    def test_async_stream(self):
+        position = broker.event_id(broker.last_seq)
+        event = broker.publish([43], 'request.rejected', {'id': 8})[43]
+
+        async def collect():
+            return [chunk async for chunk in astream(43, position, duration=0.05, heartbeat=0.01)]
+
+        chunks = asyncio.run(collect())
+        self.assertIn(f"id: {event['id']}\nevent: request.rejected\n", chunks[1])
+
+
+class BookRequestEventsViewTest(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@test.com', password='testpass123'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.owner, pickup_location='Test Location'
+        )
+        self.url = reverse('bookrequest-events')
+
+    def test_long_poll_receives_status_changes(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(self.url, {'timeout': 0})
+        self.assertEqual(response.data['events'], [])
+        last_event_id = response.data['last_event_id']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('bookrequest-list'), {'book': self.book.id, 'message': 'Please'}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        book_request = BookRequest.objects.get()
+
+        self.client.force_authenticate(user=self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('bookrequest-accept', args=[book_request.id]))
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(self.url, {'timeout': 0, 'last_event_id': last_event_id})
+        self.assertEqual(
+            [(event['event'], event['data']['id']) for event in response.data['events']],
+            [('request.created', book_request.id), ('request.accepted', book_request.id)]
+        )
+
+    def test_event_stream_negotiation(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(self.url, HTTP_ACCEPT='text/event-stream')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.close()
+
+    def test_requires_authentication(self):
+        response = self.client.get(self.url, {'timeout': 0})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
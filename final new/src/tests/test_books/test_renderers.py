@@ -0,0 +1,68 @@
+import io
+import json
+from unittest import mock
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from books.models import Book
+from books.parsers import FastJSONParser
+from books.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTest(SimpleTestCase):
+    def test_matches_stdlib_output(self):
+        data = {'title': 'Книга', 'authors': [{'id': 1}], 'cover_image': None}
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data))
+        )
+
+    def test_falls_back_without_orjson(self):
+        with mock.patch('books.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render({'id': 1}), b'{"id":1}')
+        with mock.patch('books.parsers.orjson', None):
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"id": 1}')), {'id': 1})
+
+
+class ContentNegotiationTest(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        Book.objects.create(
+            title='Test Book', description='Test Description',
+            owner=self.user, pickup_location='Test Location'
+        )
+
+    def test_msgpack_response(self):
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        data = msgpack.unpackb(response.content)
+        self.assertEqual(data['results'][0]['title'], 'Test Book')
+
+    def test_json_response(self):
+        response = self.client.get(reverse('book-list'), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.json()['results'][0]['title'], 'Test Book')
+
+    def test_msgpack_request(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse('book-list'),
+            msgpack.packb({'title': 'Packed', 'description': 'Test', 'pickup_location': 'Here'}),
+            content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Book.objects.filter(title='Packed').exists())
+
+    def test_invalid_msgpack_request(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(
+            reverse('book-list'), b'\xc1', content_type='application/msgpack'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
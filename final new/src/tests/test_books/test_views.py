@@ -1,9 +1,19 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from books.models import Book, Author, Genre
+from books.models import Book, Author, Genre, BookRequest, Tombstone
+from books.sync import format_cursor
 
 
 class BookViewSetTest(APITestCase):
@@ -35,3 +45,219 @@ class BookViewSetTest(APITestCase):
         url = reverse('book-list')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BookRequestBulkModerateTest(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@test.com', password='testpass123'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@test.com', password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='other', email='other@test.com', password='testpass123'
+        )
+        self.book = Book.objects.create(
+            title='Popular Book', description='Test Description',
+            owner=self.owner, pickup_location='Test Location'
+        )
+        self.second_book = Book.objects.create(
+            title='Second Book', description='Test Description',
+            owner=self.owner, pickup_location='Test Location'
+        )
+        self.foreign_book = Book.objects.create(
+            title='Foreign Book', description='Test Description',
+            owner=self.other, pickup_location='Test Location'
+        )
+        self.first = BookRequest.objects.create(book=self.book, requester=self.reader)
+        self.second = BookRequest.objects.create(book=self.book, requester=self.other)
+        self.third = BookRequest.objects.create(book=self.second_book, requester=self.reader)
+        self.foreign = BookRequest.objects.create(book=self.foreign_book, requester=self.reader)
+        self.url = reverse('bookrequest-bulk-moderate')
+
+    def test_accept_and_reject(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post(
+            self.url, {'accept': [self.first.id], 'reject': [self.third.id]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            {'id': self.first.id, 'status': 'accepted'},
+            {'id': self.third.id, 'status': 'rejected'},
+        ])
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.third.refresh_from_db()
+        self.book.refresh_from_db()
+        self.assertEqual(self.first.status, 'accepted')
+        self.assertEqual(self.second.status, 'rejected')
+        self.assertEqual(self.third.status, 'rejected')
+        self.assertEqual(self.book.status, 'lent')
+
+    def test_one_accept_per_book(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post(
+            self.url, {'accept': [self.first.id, self.second.id]}, format='json'
+        )
+        self.assertEqual(response.data['results'][0], {'id': self.first.id, 'status': 'accepted'})
+        self.assertEqual(response.data['results'][1], {'id': self.second.id, 'status': 'rejected'})
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.status, 'rejected')
+
+    def test_per_id_errors(self):
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.post(
+            self.url, {'reject': [self.first.id, 999999]}, format='json'
+        )
+        self.assertEqual(response.data['results'], [
+            {'id': self.first.id, 'error': 'Only the book owner can reject requests'},
+            {'id': 999999, 'error': 'Request not found'},
+        ])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, 'pending')
+
+    def test_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.owner)
+        with self.assertNumQueries(8):
+            self.client.post(
+                self.url,
+                {'accept': [self.first.id], 'reject': [self.third.id, self.foreign.id]},
+                format='json'
+            )
+
+    def test_empty_payload(self):
+        self.client.force_authenticate(user=self.owner)
+        response = self.client.post(self.url, {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CHANGES_FEED_LAG_SECONDS=0)
+class ChangesFeedTest(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.owner = User.objects.create_user(
+            username='owner', email='owner@test.com', password='testpass123'
+        )
+        self.reader = User.objects.create_user(
+            username='reader', email='reader@test.com', password='testpass123'
+        )
+        self.books = [
+            Book.objects.create(
+                title=f'Book {i}', description='Test Description',
+                owner=self.owner, pickup_location='Test Location'
+            )
+            for i in range(3)
+        ]
+
+    def test_full_sync_then_incremental(self):
+        url = reverse('book-changes')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([b['id'] for b in response.data['results']], [b.id for b in self.books])
+        self.assertFalse(response.data['has_more'])
+        cursor = response.data['cursor']
+
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['cursor'], cursor)
+
+        self.books[0].title = 'Renamed'
+        self.books[0].save()
+        deleted_id = self.books[1].id
+        self.books[1].delete()
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([b['title'] for b in response.data['results']], ['Renamed'])
+        self.assertEqual(response.data['deleted'], [deleted_id])
+
+    def test_paging_with_limit(self):
+        url = reverse('book-changes')
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            seen.extend(b['id'] for b in response.data['results'])
+            cursor = response.data['cursor']
+            if not response.data['has_more']:
+                break
+        self.assertEqual(seen, [b.id for b in self.books])
+
+    @override_settings(CHANGES_FEED_LAG_SECONDS=10)
+    def test_rows_committing_out_of_order_are_not_skipped(self):
+        url = reverse('book-changes')
+        now = timezone.now()
+        Book.objects.filter(pk__in=[b.pk for b in self.books[:2]]).update(updated_at=now - timedelta(minutes=1))
+        Book.objects.filter(pk=self.books[2].pk).update(updated_at=now - timedelta(seconds=1))
+        response = self.client.get(url)
+        self.assertEqual([b['id'] for b in response.data['results']], [b.id for b in self.books[:2]])
+        cursor = response.data['cursor']
+
+        # Took its timestamp before the last book, but committed after the client synced
+        late = Book.objects.create(
+            title='Late', description='Test Description', owner=self.owner, pickup_location='Test Location'
+        )
+        Book.objects.filter(pk=late.pk).update(updated_at=now - timedelta(seconds=2))
+
+        with mock.patch('books.sync.timezone.now', return_value=now + timedelta(seconds=15)):
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual([b['id'] for b in response.data['results']], [late.id, self.books[2].id])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('book-changes'), {'cursor': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_request_changes_are_scoped_to_user(self):
+        book_request = BookRequest.objects.create(book=self.books[0], requester=self.reader)
+        stranger = get_user_model().objects.create_user(
+            username='stranger', email='stranger@test.com', password='testpass123'
+        )
+        url = reverse('bookrequest-changes')
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(url)
+        self.assertEqual([r['id'] for r in response.data['results']], [book_request.id])
+        cursor = response.data['cursor']
+
+        request_id = book_request.id
+        book_request.delete()
+        response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(response.data['deleted'], [request_id])
+
+        self.client.force_authenticate(user=stranger)
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_request_tombstones_look_up_each_owner_once(self):
+        for i in range(3):
+            reader = get_user_model().objects.create_user(
+                username=f'reader{i}', email=f'reader{i}@test.com', password='testpass123'
+            )
+            BookRequest.objects.create(book=self.books[0], requester=reader)
+
+        with CaptureQueriesContext(connection) as queries:
+            BookRequest.objects.filter(book=self.books[0]).delete()
+        owner_lookups = [q for q in queries if q['sql'].startswith('SELECT "book"."owner_id"')]
+        self.assertEqual(len(owner_lookups), 1)
+        self.assertEqual(
+            set(Tombstone.objects.filter(model='bookrequest').values_list('owner_id', flat=True)),
+            {self.owner.id}
+        )
+
+    def test_expired_cursor(self):
+        cursor = format_cursor(timezone.now() - timedelta(days=365), 0)
+        response = self.client.get(reverse('book-changes'), {'cursor': cursor})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_purge_tombstones(self):
+        self.books[0].delete()
+        self.books[1].delete()
+        Tombstone.objects.filter(model='book').update(deleted_at=timezone.now() - timedelta(days=365))
+        self.books[2].delete()
+
+        call_command('purge_tombstones', stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('model', flat=True)), ['book'])
@@ -0,0 +1,87 @@
+import gzip
+from unittest import mock
+
+import brotli
+import zstandard
+from django.core.cache import caches
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+import compression_middleware
+from compression_middleware import CompressionMiddleware, choose_encoding
+
+BODY = b'{"title": "Book", "description": "A long description"}' * 200
+
+
+@override_settings(COMPRESSION_MIN_SIZE=512, COMPRESSION_CACHE_MIN_SIZE=4096, COMPRESSION_CACHE_MAX_SIZE=65536)
+class CompressionMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        caches['compression'].clear()
+
+    def run_request(self, response, accept_encoding='gzip, deflate, br, zstd'):
+        request = self.factory.get('/api/books/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_choose_encoding(self):
+        self.assertEqual(choose_encoding('gzip, br, zstd'), 'zstd')
+        self.assertEqual(choose_encoding('gzip, br;q=0.5'), 'br')
+        self.assertEqual(choose_encoding('gzip, zstd;q=0'), 'gzip')
+        self.assertEqual(choose_encoding('*'), 'zstd')
+        self.assertIsNone(choose_encoding('identity'))
+        self.assertIsNone(choose_encoding(''))
+
+    def test_negotiated_encodings(self):
+        response = self.run_request(HttpResponse(BODY, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        self.assertEqual(zstandard.ZstdDecompressor().decompress(response.content), BODY)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+        response = self.run_request(HttpResponse(BODY, content_type='application/json'), 'gzip, br')
+        self.assertEqual(brotli.decompress(response.content), BODY)
+
+        response = self.run_request(HttpResponse(BODY, content_type='application/json'), 'gzip')
+        self.assertEqual(gzip.decompress(response.content), BODY)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+    def test_gzip_only_without_optional_libraries(self):
+        with mock.patch.dict(compression_middleware.ENCODINGS, clear=True):
+            compression_middleware.ENCODINGS['gzip'] = (
+                compression_middleware._gzip_compress, compression_middleware._gzip_stream
+            )
+            response = self.run_request(HttpResponse(BODY, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_skips_small_and_precompressed_bodies(self):
+        response = self.run_request(HttpResponse(b'{"id": 1}', content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self.run_request(HttpResponse(BODY, content_type='image/jpeg'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, BODY)
+
+        response = self.run_request(StreamingHttpResponse(iter([BODY]), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        response = self.run_request(
+            StreamingHttpResponse(iter([BODY[:1000], BODY[1000:]]), content_type='application/json'),
+            'gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), BODY)
+
+    def test_large_bodies_are_compressed_once(self):
+        with mock.patch.object(compression_middleware.zstandard, 'ZstdCompressor',
+                               wraps=zstandard.ZstdCompressor) as compressor:
+            first = self.run_request(HttpResponse(BODY, content_type='application/json'))
+            second = self.run_request(HttpResponse(BODY, content_type='application/json'))
+        self.assertEqual(compressor.call_count, 1)
+        self.assertEqual(first.content, second.content)
+
+    def test_huge_bodies_are_not_cached(self):
+        body = BODY * 10
+        self.run_request(HttpResponse(body, content_type='application/json'))
+        self.assertEqual(len(caches['compression']._cache), 0)
+        self.run_request(HttpResponse(BODY, content_type='application/json'))
+        self.assertEqual(len(caches['compression']._cache), 1)
@@ -0,0 +1,72 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from books.models import Book
+from db_router import PIN_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware, pinned_to_primary, use_primary
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_PIN_SECONDS=30)
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.routed = []
+
+    def run_request(self, request, write=False):
+        def view(request):
+            self.routed.append(self.router.db_for_read(Book))
+            if write:
+                self.router.db_for_write(Book)
+                self.routed.append(self.router.db_for_read(Book))
+            return HttpResponse()
+
+        return ReplicaRoutingMiddleware(view)(request)
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.run_request(self.factory.get('/api/books/'))
+        self.assertEqual(self.routed, ['replica1'])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_unsafe_requests_use_primary_and_pin_client(self):
+        response = self.run_request(self.factory.post('/api/requests/1/accept/'), write=True)
+        self.assertEqual(self.routed, ['default', 'default'])
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 30)
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get('/api/requests/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        self.run_request(request)
+        self.assertEqual(self.routed, ['default'])
+
+    def test_credential_pins_client_without_cookies(self):
+        self.run_request(
+            self.factory.post('/api/requests/1/accept/', HTTP_AUTHORIZATION='Bearer writer'), write=True
+        )
+        self.run_request(self.factory.get('/api/requests/', HTTP_AUTHORIZATION='Bearer writer'))
+        self.run_request(self.factory.get('/api/requests/', HTTP_AUTHORIZATION='Bearer someone-else'))
+        self.assertEqual(self.routed, ['default', 'default', 'default', 'replica1'])
+
+    def test_reads_after_write_in_same_request_use_primary(self):
+        self.run_request(self.factory.get('/api/books/'), write=True)
+        self.assertEqual(self.routed, ['replica1', 'default'])
+
+    def test_pinned_to_primary_and_use_primary(self):
+        def view(request):
+            self.routed.append(pinned_to_primary())
+            with use_primary():
+                self.routed.append(self.router.db_for_read(Book))
+            self.routed.append(self.router.db_for_read(Book))
+            return HttpResponse()
+
+        ReplicaRoutingMiddleware(view)(self.factory.get('/api/books/1/'))
+        pinned = self.factory.get('/api/books/1/')
+        pinned.COOKIES[PIN_COOKIE] = '1'
+        ReplicaRoutingMiddleware(view)(pinned)
+        self.assertEqual(self.routed, [False, 'default', 'replica1', True, 'default', 'default'])
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), 'default')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'books'))
+        self.assertIsNone(self.router.allow_migrate('default', 'books'))
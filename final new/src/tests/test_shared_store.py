@@ -0,0 +1,48 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from shared_store import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = SQLiteCache('test-cache.sqlite3', {})
+        self.cache.clear()
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertTrue(self.cache.delete('key'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_only_when_missing_or_expired(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+        with mock.patch('shared_store.time.time', return_value=10 ** 10):
+            self.assertTrue(self.cache.add('key', 3))
+            self.assertEqual(self.cache.get('key'), 3)
+
+    def test_expired_entries_are_missing(self):
+        self.cache.set('key', 1, timeout=30)
+        with mock.patch('shared_store.time.time', return_value=10 ** 10):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertFalse(self.cache.touch('key'))
+
+    def test_incr_is_atomic_across_connections(self):
+        self.cache.add('counter', 0, timeout=None)
+        # Each thread opens its own connection, like a separate worker process
+        threads = [
+            threading.Thread(target=lambda: [self.cache.incr('counter') for _ in range(25)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 100)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
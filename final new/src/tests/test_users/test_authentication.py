@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from books.views import BookRequestViewSet
+from shared_store import SQLiteCache
+from db_router import PIN_COOKIE
+from users.authentication import StatelessJWTAuthentication
+from users.models import token_state_cache_key
+
+
+class StatelessJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123',
+            first_name='Test', last_name='User'
+        )
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'email': 'test@test.com', 'password': 'testpass123'},
+            format='json'
+        )
+        self.access = response.data['access']
+        self.url = reverse('bookrequest-list')
+
+    def get(self, authentication_class, token=None):
+        with mock.patch.object(BookRequestViewSet, 'authentication_classes', [authentication_class]):
+            return self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {token or self.access}')
+
+    def test_token_carries_user_claims(self):
+        token = AccessToken(self.access)
+        self.assertEqual(token['email'], 'test@test.com')
+        self.assertTrue(token['is_active'])
+        self.assertEqual(token['token_version'], 0)
+
+    def test_skips_user_lookup(self):
+        self.get(StatelessJWTAuthentication)
+
+        with CaptureQueriesContext(connection) as regular:
+            self.assertEqual(self.get(JWTAuthentication).status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as stateless:
+            self.assertEqual(self.get(StatelessJWTAuthentication).status_code, status.HTTP_200_OK)
+        self.assertEqual(len(stateless), len(regular) - 1)
+
+    def test_other_fields_load_lazily_in_one_query(self):
+        user = get_user_model().from_token_claims(self.user.id, self.user.email, True)
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.email, user.is_active), (self.user.id, 'test@test.com', True))
+            self.assertEqual(user, self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.first_name, 'Test')
+            self.assertEqual(user.last_name, 'User')
+            self.assertEqual(user.username, 'testuser')
+
+    def test_revoked_tokens_are_rejected(self):
+        self.get(StatelessJWTAuthentication)
+        self.user.revoke_tokens()
+        response = self.get(StatelessJWTAuthentication)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['code'], 'token_revoked')
+
+    def test_revocation_reaches_other_workers(self):
+        self.get(StatelessJWTAuthentication)
+        # Another process on the host opens the same cache file
+        other_worker = SQLiteCache(settings.CACHES['shared']['LOCATION'], {})
+        key = token_state_cache_key(self.user.id)
+        self.assertEqual(other_worker.get(key), (0, True))
+        self.user.revoke_tokens()
+        self.assertIsNone(other_worker.get(key))
+
+    def test_inactive_users_are_rejected(self):
+        self.get(StatelessJWTAuthentication)
+        self.user.is_active = False
+        self.user.save()
+        response = self.get(StatelessJWTAuthentication)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tokens_without_claims_fall_back_to_lookup(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.get(StatelessJWTAuthentication, str(token))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# 'replica1' is not a configured database, so any read routed to it fails.
+# Transaction test cases are needed because reads in a transaction use the primary.
+@override_settings(REPLICA_DATABASES=['replica1'])
+class TokenStateReplicaTest(APITransactionTestCase):
+    def test_revocation_state_is_read_from_primary(self):
+        user = get_user_model().objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123'
+        )
+        access = self.client.post(
+            reverse('token_obtain_pair'), {'email': 'test@test.com', 'password': 'testpass123'}, format='json'
+        ).data['access']
+        user.revoke_tokens()
+        # A safe request from a client without the pin cookie
+        self.assertNotIn(PIN_COOKIE, self.client.cookies)
+        with mock.patch.object(BookRequestViewSet, 'authentication_classes', [StatelessJWTAuthentication]):
+            response = self.client.get(reverse('bookrequest-list'), HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['code'], 'token_revoked')
+
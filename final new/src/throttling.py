@@ -0,0 +1,151 @@
+"""
+Token bucket throttles. A rate of "N/period" allows bursts of up to N requests
+and refills the bucket at N tokens per period.
+
+Buckets live in a SQLite file in CACHE_DIR shared by every worker on the host,
+so the limits hold for the host as a whole rather than per worker. Each bucket
+is updated by a single atomic statement.
+"""
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+import metrics
+from shared_store import SQLiteFile
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Seconds between sweeps of buckets that have refilled completely
+PRUNE_INTERVAL = 60
+
+_REFILLED = 'MIN(:capacity, tokens + MAX(0, :now - updated) * :refill_rate)'
+_TAKE_SQL = f"""
+    INSERT INTO bucket (key, tokens, updated, expires, allowed)
+    VALUES (:key, :capacity - 1, :now, :expires, 1)
+    ON CONFLICT (key) DO UPDATE SET
+        tokens = {_REFILLED} - ({_REFILLED} >= 1),
+        allowed = {_REFILLED} >= 1,
+        updated = MAX(updated, :now),
+        expires = :expires
+    RETURNING tokens, allowed
+"""
+
+
+class TokenBucketStore:
+    """
+    Token buckets in the CACHE_DIR file throttle.sqlite3.
+    """
+
+    def __init__(self):
+        self._file = SQLiteFile(
+            'throttle.sqlite3',
+            'CREATE TABLE IF NOT EXISTS bucket ('
+            'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+            'expires REAL NOT NULL, allowed INTEGER NOT NULL)'
+        )
+        self._pruned_at = 0
+
+    def take(self, key, capacity, refill_rate):
+        """
+        Take a token from the bucket if one is left. Returns (allowed, tokens).
+        """
+        connection = self._file.connection()
+        now = time.time()
+        # A bucket left alone this long is full again, the same as a missing one
+        expires = now + capacity / refill_rate
+        tokens, allowed = connection.execute(_TAKE_SQL, {
+            'key': key, 'capacity': capacity, 'refill_rate': refill_rate, 'now': now, 'expires': expires
+        }).fetchone()
+        if now - self._pruned_at > PRUNE_INTERVAL:
+            self._pruned_at = now
+            connection.execute('DELETE FROM bucket WHERE expires < ?', (now,))
+        return bool(allowed), tokens
+
+    def clear(self):
+        self._file.execute('DELETE FROM bucket')
+
+
+bucket_store = TokenBucketStore()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+    store = bucket_store
+
+    def __init__(self):
+        self.capacity, self.refill_rate = self.parse_rate(self.get_rate())
+        self.wait_seconds = None
+
+    def get_rate(self):
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(f"No throttle rate set for scope '{self.scope}'")
+
+    @staticmethod
+    def parse_rate(rate):
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, capacity / PERIODS[period[0]]
+
+    def get_cache_key(self, request, view):
+        """
+        Return the bucket key for the request, or None to skip throttling.
+        """
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def get_client_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+
+        allowed, tokens = self.store.take(key, self.capacity, self.refill_rate)
+        if not allowed:
+            self.wait_seconds = (1 - tokens) / self.refill_rate
+            metrics.incr(f'throttle.{self.scope}.throttled')
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return f'{self.scope}:{self.get_ident(request)}'
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not (request.user and request.user.is_authenticated):
+            return None
+        return f'{self.scope}:{request.user.pk}'
+
+
+class WriteTokenBucketThrottle(TokenBucketThrottle):
+    """
+    Separate, tighter bucket for unsafe methods.
+    """
+    scope = 'write'
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return f'{self.scope}:{self.get_client_key(request)}'
+
+
+class BookRequestCreateThrottle(WriteTokenBucketThrottle):
+    scope = 'request_create'
@@ -11,6 +11,8 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from metrics import MetricsView
+
 schema_view = get_schema_view(
     openapi.Info(
         title="Book API",
@@ -28,5 +30,6 @@ urlpatterns = [
                   path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
                   path('api/', include('books.urls')),
                   path('api/users/', include('users.urls')),
+                  path('api/metrics/', MetricsView.as_view(), name='metrics'),
                   path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
               ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
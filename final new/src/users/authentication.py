@@ -0,0 +1,35 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+TOKEN_CLAIMS = ('email', 'is_active', 'token_version')
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds request.user from the token claims
+    instead of loading the user row on every request. Revocation is checked
+    against the user's cached token version.
+
+    Tokens issued without the claims fall back to the regular lookup.
+    """
+
+    def get_user(self, validated_token):
+        if any(claim not in validated_token for claim in TOKEN_CLAIMS):
+            return super().get_user(validated_token)
+
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        state = User.get_token_state(user_id)
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        token_version, is_active = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token['token_version'] != token_version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+        return User.from_token_claims(user_id, validated_token['email'], is_active)
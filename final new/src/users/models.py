@@ -1,5 +1,12 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import F
+
+
+def token_state_cache_key(user_id):
+    return f'user_token_state:{user_id}'
 
 
 class User(AbstractUser):
@@ -11,6 +18,8 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=30)
     age = models.IntegerField(null=True)
     location = models.TextField(null=True, blank=True)
+    # Bumped to revoke every JWT issued to the user
+    token_version = models.PositiveIntegerField(default=0)
 
     groups = models.ManyToManyField(
         'auth.Group',
@@ -32,3 +41,48 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        caches['shared'].delete(token_state_cache_key(self.pk))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        # Loading one deferred field loads all of them, so a user built from
+        # token claims costs at most one query however many fields a view reads
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using, fields, from_queryset)
+
+    @classmethod
+    def from_token_claims(cls, user_id, email, is_active):
+        """
+        Build a user from JWT claims without a query. Other fields are
+        deferred and loaded from the database on first access.
+        """
+        claims = {'id': user_id, 'email': email, 'is_active': is_active}
+        field_names = [f.attname for f in cls._meta.concrete_fields if f.attname in claims]
+        return cls.from_db(None, field_names, [claims[name] for name in field_names])
+
+    @classmethod
+    def get_token_state(cls, user_id):
+        """
+        Return (token_version, is_active) for the user, or None if it does not
+        exist. Cached for JWT_TOKEN_STATE_CACHE_SECONDS in the cache shared by
+        all workers, which save() and revoke_tokens() clear.
+        """
+        cache = caches['shared']
+        key = token_state_cache_key(user_id)
+        state = cache.get(key)
+        if state is None:
+            # Every worker trusts the cached state, so never take it from a lagging replica
+            state = cls.objects.db_manager(DEFAULT_DB_ALIAS).filter(pk=user_id).values_list('token_version', 'is_active').first()
+            if state is None:
+                return None
+            cache.set(key, state, settings.JWT_TOKEN_STATE_CACHE_SECONDS)
+        return state
+
+    def revoke_tokens(self):
+        User.objects.filter(pk=self.pk).update(token_version=F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        caches['shared'].delete(token_state_cache_key(self.pk))
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer as BaseTokenObtainPairSerializer
+
 from .models import User
 
 
@@ -12,3 +14,14 @@ class UserSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user = User.objects.create_user(**validated_data)
         return user
+
+
+class TokenObtainPairSerializer(BaseTokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Claims needed by StatelessJWTAuthentication
+        token = super().get_token(user)
+        token['email'] = user.email
+        token['is_active'] = user.is_active
+        token['token_version'] = user.token_version
+        return token